@@ -1,13 +1,16 @@
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 from .main import PaperService
+from .arxiv_fetcher import ARXIV_CATEGORIES
 from fastapi import Request
 import json
 import os
+import hashlib
+import orjson
 from fastapi import Query
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Mapping
 from pathlib import Path
 from loguru import logger
 from datetime import datetime, timezone, timedelta
@@ -24,59 +27,51 @@ def create_response(status_code: int, status: str, message: str, data: Any = Non
         data: レスポンスデータ (オプション)
 
     Returns:
-        JSONResponse: 統一形式のレスポンス
+        ORJSONResponse: 統一形式のレスポンス（orjsonでシリアライズ）
     """
     response = {
         "status": status,
         "message": message
     }
     
+    # Queryオブジェクトなどは呼び出し側でリスト・文字列に変換済みのため、そのまま追加する
     if data is not None:
-        # FastAPIのQueryオブジェクトを処理するための特別な処理
-        processed_data = {}
-        for key, value in data.items():
-            # リスト型のQueyパラメータを変換
-            if hasattr(value, '__iter__') and not isinstance(value, (str, dict, list)):
-                try:
-                    processed_data[key] = list(value)
-                except:
-                    processed_data[key] = str(value)
-            # 単一のQueryパラメータを変換
-            elif hasattr(value, '__str__') and not isinstance(value, (str, int, float, bool, dict, list)):
-                processed_data[key] = str(value)
-            # 標準的なJSON化可能なデータ型はそのまま
-            else:
-                processed_data[key] = value
-        response.update(processed_data)
+        response.update(data)
     
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status_code,
         content=response
     )
 
 app = FastAPI(title="arXiv Paper Summarizer", 
               description="arXivの論文を検索・監視・要約するAPI",
-              version="1.0.0")
+              version="1.0.0",
+              default_response_class=ORJSONResponse)
 
 # 静的ファイルとテンプレートの設定
 static_dir = Path(__file__).parent.parent / "static"
 templates_dir = Path(__file__).parent.parent / "templates"
-static_dir.mkdir(exist_ok=True)
-templates_dir.mkdir(exist_ok=True)
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+# ディレクトリの作成は起動時イベントで行うため、マウント時の存在チェックは省略する
+app.mount("/static", StaticFiles(directory=static_dir, check_dir=False), name="static")
 templates = Jinja2Templates(directory=templates_dir)
 
-# サービスの依存性注入
-def get_paper_service():
-    return PaperService()
+# 本番環境ではテンプレートの更新チェックを無効化し、コンパイル済みテンプレートを使い回す
+if os.getenv("ENV") == "production":
+    templates.env.auto_reload = False
 
-# サービスのグローバルインスタンス（スケジューラ用）
+# サービスのグローバルインスタンス（スケジューラ・各APIで共有）
 paper_service = PaperService()
 
+# サービスの依存性注入
+def get_paper_service():
+    return paper_service
+
 @app.on_event("startup")
 async def startup_event():
     """アプリケーション起動時の処理"""
+    for directory in (static_dir, templates_dir):
+        directory.mkdir(exist_ok=True)
     paper_service.start_scheduler()
     logger.info("アプリケーションを開始しました")
 
@@ -84,21 +79,41 @@ async def startup_event():
 async def shutdown_event():
     """アプリケーション終了時の処理"""
     paper_service.stop_scheduler()
+    await paper_service.notifier.close()
+    await paper_service.summarizer.close()
     logger.info("アプリケーションを終了しました")
 
+# トップページは動的なデータを持たないため、描画結果をベースURLごとにキャッシュする
+# （url_forが絶対URLを生成するため、ホスト名ごとに描画結果が異なる）
+_INDEX_CACHE_MAX = 16
+_index_cache: Dict[str, bytes] = {}
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    base_url = str(request.base_url)
+    body = _index_cache.get(base_url)
+    if body is None:
+        body = templates.TemplateResponse("index.html", {"request": request}).body
+        # 任意のHostヘッダーでキャッシュが肥大化しないよう上限を設ける
+        if len(_index_cache) < _INDEX_CACHE_MAX:
+            _index_cache[base_url] = body
+    return HTMLResponse(content=body)
+
+# カテゴリ一覧は固定値のため、レスポンスを起動時に一度だけシリアライズしておく
+_CATEGORIES_JSON = orjson.dumps({
+    "status": "success",
+    "message": f"{len(ARXIV_CATEGORIES)}種類のカテゴリが利用可能です",
+    "categories": ARXIV_CATEGORIES
+})
+_CATEGORIES_ETAG = f'"{hashlib.md5(_CATEGORIES_JSON).hexdigest()}"'
 
 @app.get("/api/categories")
-async def get_categories(service: PaperService = Depends(get_paper_service)):
-    categories = service.get_categories()
-    return create_response(
-        status_code=status.HTTP_200_OK,
-        status="success",
-        message=f"{len(categories)}種類のカテゴリが利用可能です",
-        data={"categories": categories}
-    )
+async def get_categories(request: Request):
+    """利用可能なカテゴリ一覧を取得（ETagによる条件付きGETに対応）"""
+    headers = {"ETag": _CATEGORIES_ETAG}
+    if request.headers.get("if-none-match") == _CATEGORIES_ETAG:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=_CATEGORIES_JSON, media_type="application/json", headers=headers)
 
 @app.get("/api/search")
 async def search_papers(
@@ -177,12 +192,17 @@ async def add_watch_keyword(
 ):
     """キーワードを監視リストに追加"""
     try:
-        service.add_watch_keyword(keyword, categories)
+        if not await service.add_watch_keyword(keyword, categories):
+            return create_response(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                status="error",
+                message=f"キーワード '{keyword}' の追加に失敗しました"
+            )
         return create_response(
             status_code=status.HTTP_201_CREATED,
             status="success",
             message=f"キーワード '{keyword}' を監視リストに追加しました",
-            data={"keyword": keyword, "categories": categories or []}
+            data={"keyword": keyword, "categories": list(categories) if categories else []}
         )
     except Exception as e:
         logger.error(f"監視キーワード追加エラー: {str(e)}")
@@ -199,7 +219,7 @@ async def remove_watch_keyword(
 ):
     """キーワードを監視リストから削除"""
     try:
-        service.remove_watch_keyword(keyword)
+        await service.remove_watch_keyword(keyword)
         return create_response(
             status_code=status.HTTP_200_OK,
             status="success",
@@ -213,17 +233,33 @@ async def remove_watch_keyword(
             message=f"キーワードの削除に失敗しました: {str(e)}"
         )
 
+# 監視キーワード一覧のレスポンスキャッシュ（バージョン番号, シリアライズ済みJSON）
+_watch_response_cache: Optional[tuple] = None
+# バージョン番号はプロセスごとに0から始まるため、再起動前のETagと衝突しないよう起動IDを含める
+_BOOT_ID = os.urandom(4).hex()
+
 @app.get("/api/watch")
-async def get_watched_keywords(service: PaperService = Depends(get_paper_service)):
-    """監視中のキーワード一覧を取得"""
+async def get_watched_keywords(request: Request, service: PaperService = Depends(get_paper_service)):
+    """監視中のキーワード一覧を取得（ETagによる条件付きGETに対応）"""
+    global _watch_response_cache
     try:
-        watched_keywords = service.get_watched_keywords()
-        return create_response(
-            status_code=status.HTTP_200_OK,
-            status="success",
-            message=f"{len(watched_keywords.get('keywords', []))}件の監視中キーワードがあります",
-            data={"watched_keywords": watched_keywords}
-        )
+        version = service.get_watch_version()
+        etag = f'W/"watch-{_BOOT_ID}-{version}"'
+        headers = {"ETag": etag}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
+        # キーワードが変更されていなければシリアライズ済みのレスポンスを再利用
+        if _watch_response_cache is None or _watch_response_cache[0] != version:
+            watched_keywords = service.get_watched_keywords()
+            body = orjson.dumps({
+                "status": "success",
+                "message": f"{len(watched_keywords.get('keywords', []))}件の監視中キーワードがあります",
+                "watched_keywords": dict(watched_keywords)
+            })
+            _watch_response_cache = (version, body)
+        
+        return Response(content=_watch_response_cache[1], media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"監視キーワード取得エラー: {str(e)}")
         return create_response(
@@ -247,15 +283,13 @@ async def check_new_papers(
             watched_keywords = service.get_watched_keywords()
             
             # 辞書からすべての論文を単一のリストに変換
+            # （matched_keywordはPaperService.check_new_papersで設定済み）
             all_papers = []
-            for keyword, paper_list in papers_by_keyword.items():
-                # 各論文にマッチしたキーワードを追加
-                for paper in paper_list:
-                    paper['matched_keyword'] = keyword
+            for paper_list in papers_by_keyword.values():
                 all_papers.extend(paper_list)
             
             # watched_keywordsが辞書型かつkeyswordsキーを持っていることを確認
-            if isinstance(watched_keywords, dict) and "keywords" in watched_keywords:
+            if isinstance(watched_keywords, Mapping) and "keywords" in watched_keywords:
                 # 論文を日付とキーワードでグループ化
                 grouped_papers = service.group_papers_by_date_and_keyword(
                     all_papers, watched_keywords["keywords"]
@@ -1,13 +1,26 @@
+import asyncio
+import functools
 import json
+import operator
+import os
+import re
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional, Union, Sequence
+from typing import List, Dict, Any, Optional, Union, Sequence, Set, Tuple, Mapping
 from pathlib import Path
+from types import MappingProxyType
 import arxiv
-from .utils import setup_logger, ConfigManager, async_error_handler, CacheManager
+from .utils import setup_logger, ConfigManager, async_error_handler, async_retry, CacheManager
+from .ratelimit import DomainLimiter
 
 # 共通ロギング設定を使用
 logger = setup_logger("arxiv_fetcher")
 
+# arXivのカテゴリID（cs.AI, stat.ML, physics.acc-ph など）の形式
+_CATEGORY_RE = re.compile(r'[a-z\-]{1,12}\.[A-Za-z\-]{1,12}')
+
+# 著者名の取り出しに使用（内包表記より属性アクセスが高速）
+_get_name = operator.attrgetter("name")
+
 ARXIV_CATEGORIES = {
     'cs': {
         'name': 'Computer Science',
@@ -27,6 +40,68 @@ ARXIV_CATEGORIES = {
     }
 }
 
+@functools.lru_cache(maxsize=4096)
+def _extract_arxiv_id(entry_id: str) -> str:
+    """
+    entry_idからarXiv IDを抽出する
+    
+    Args:
+        entry_id (str): 論文のentry_id
+        
+    Returns:
+        str: arXiv ID
+    """
+    # 典型的なentry_idは http://arxiv.org/abs/2401.12345v1 のような形式
+    if entry_id.startswith('http'):
+        return entry_id.rpartition('/')[2]
+    return entry_id
+
+@functools.lru_cache(maxsize=4096)
+def _generate_arxiv_url(entry_id: str) -> str:
+    """
+    arXivのURLを生成する
+    
+    Args:
+        entry_id (str): 論文のentry_id
+        
+    Returns:
+        str: arXivのURL
+    """
+    return f"https://arxiv.org/abs/{_extract_arxiv_id(entry_id)}"
+
+@functools.lru_cache(maxsize=128)
+def _build_search_query(query: str, categories: Optional[Tuple[str, ...]] = None) -> Tuple[str, Tuple[str, ...]]:
+    """
+    検索クエリ文字列を組み立てる（同じ引数の結果はキャッシュされる）
+    
+    Args:
+        query (str): 検索クエリ
+        categories (Tuple[str, ...], optional): 検索対象カテゴリ
+        
+    Returns:
+        Tuple[str, Tuple[str, ...]]: 検索クエリ文字列と、適用した有効なカテゴリ
+    """
+    # スペースを含むクエリはダブルクォートで囲んでフレーズ検索を強制
+    if query and ' ' in query and not (query.startswith('"') and query.endswith('"')):
+        query = f'"{query}"'
+
+    if not categories:
+        return query, ()
+
+    # 不正な値やオブジェクト表現を排除し、有効なカテゴリIDのみを抽出
+    valid_categories = []
+    for cat in categories:
+        # 文字列化し、標準的なカテゴリIDパターンに一致するもののみを使用
+        cat_str = str(cat).strip()
+        if _CATEGORY_RE.fullmatch(cat_str):
+            valid_categories.append(cat_str)
+
+    # 有効なカテゴリが存在する場合のみフィルタを適用
+    if not valid_categories:
+        return query, ()
+    category_filter = ' OR '.join(f'cat:{cat}' for cat in valid_categories)
+    return f"({query}) AND ({category_filter})", tuple(valid_categories)
+
 class ArxivFetcher:
     """
     arXivから論文を検索・取得するためのクラス。
@@ -39,7 +114,9 @@ class ArxivFetcher:
         ArxivFetcherクラスの初期化。
         設定ファイルの読み込みと必要なディレクトリの作成を行います。
         """
-        self.client = arxiv.Client()
+        # リトライは_fetch_resultsで指数バックオフとリクエスト間隔の制限付きで行うため、
+        # クライアント内部でのリトライは無効にする（二重のリトライでリクエスト数が増えるのを防ぐ）
+        self.client = arxiv.Client(num_retries=0)
         self.watch_file = Path("data/watched_keywords.json")
         self.last_check_file = Path("data/last_check.json")
         
@@ -48,10 +125,25 @@ class ArxivFetcher:
         
         # 監視キーワードの読み込み
         self.watched_keywords = self._load_watched_keywords()
+        # 呼び出し側での意図しない変更を防ぐ読み取り専用ビュー（追加・削除は自動的に反映される）
+        self._watched_ro = MappingProxyType(self.watched_keywords)
+        # 重複チェック用のセット（保存・表示には順序を保持したリストを使用）
+        self._kw_set: Set[str] = set(self.watched_keywords["keywords"])
+        self._cat_set: Set[str] = set(self.watched_keywords.get("categories", []))
+        # 最終チェック日時とその読み込み元ファイルの更新日時
+        self._last_check_mtime: Optional[int] = None
         self.last_check = self._load_last_check()
         
+        # 監視キーワードの変更ごとに増加するバージョン番号（レスポンスキャッシュの無効化に使用）
+        self._watch_version = 0
         # キャッシュの有効期間（秒）
         self.cache_expire = 3600  # 1時間
+        
+        # arXiv APIへの同時リクエスト数の上限
+        # arxiv.Clientのページ間の待機はスレッド間で排他されないため、既定では1件ずつ実行する
+        self._arxiv_sem = asyncio.Semaphore(int(os.getenv("ARXIV_CONCURRENCY", "1")))
+        # arXiv APIへのリクエスト開始間隔（秒）の制限（arXivの利用規約は3秒に1リクエスト）
+        self._arxiv_limiter = DomainLimiter(float(os.getenv("ARXIV_REQUEST_INTERVAL", "3.0")))
 
     def _load_watched_keywords(self) -> Dict[str, List[str]]:
         """
@@ -60,26 +152,43 @@ class ArxivFetcher:
         Returns:
             Dict[str, List[str]]: キーワードとカテゴリのリスト
         """
-        data = ConfigManager.load_json(str(self.watch_file))
-        return data if data else {"keywords": [], "categories": []}
+        data = ConfigManager.load_json_cached(str(self.watch_file))
+        if not data:
+            return {"keywords": [], "categories": []}
+        # キャッシュされた内容を直接変更しないようリストを複製する
+        return {key: list(value) if isinstance(value, list) else value for key, value in data.items()}
 
     def _load_last_check(self) -> datetime:
         """
         最終チェック日時を読み込む
         
+        ファイルが前回の読み込みから更新されていなければ、解析済みの値を返します。
+        
         Returns:
             datetime: 最終チェック日時、ない場合は現在時刻
         """
-        data = ConfigManager.load_json(str(self.last_check_file))
+        try:
+            mtime = self.last_check_file.stat().st_mtime_ns
+        except FileNotFoundError:
+            return datetime.now(timezone.utc)
+        
+        if mtime == self._last_check_mtime:
+            return self.last_check
+        
+        data = ConfigManager.load_json_cached(str(self.last_check_file))
         if data and "last_check" in data:
+            self._last_check_mtime = mtime
             return datetime.fromisoformat(data["last_check"])
         return datetime.now(timezone.utc)
 
-    def _save_watched_keywords(self):
+    async def _save_watched_keywords(self):
         """監視キーワードを保存"""
-        ConfigManager.save_json(str(self.watch_file), self.watched_keywords)
+        # メモリ上の内容は保存前に変更済みのため、保存に失敗してもバージョンは更新して
+        # 古いレスポンスキャッシュ（ETag）が返されないようにする
+        self._watch_version += 1
+        await ConfigManager.save_json_async(str(self.watch_file), self.watched_keywords, durable=True)
 
-    def _save_last_check(self, date: datetime = None):
+    async def _save_last_check(self, date: datetime = None):
         """
         最終チェック日時を保存
         
@@ -89,10 +198,10 @@ class ArxivFetcher:
         if date is None:
             date = datetime.now(timezone.utc)
         self.last_check = date
-        ConfigManager.save_json(str(self.last_check_file), {"last_check": self.last_check.isoformat()})
+        await ConfigManager.save_json_async(str(self.last_check_file), {"last_check": self.last_check.isoformat()})
         logger.info(f"最終チェック時刻を更新しました: {self.last_check.isoformat()}")
 
-    def add_watch_keyword(self, keyword: str, categories: List[str] = None) -> bool:
+    async def add_watch_keyword(self, keyword: str, categories: List[str] = None) -> bool:
         """
         監視キーワードを追加
         
@@ -108,22 +217,24 @@ class ArxivFetcher:
                 logger.warning("空のキーワードは追加できません")
                 return False
                 
-            if keyword not in self.watched_keywords["keywords"]:
+            if keyword not in self._kw_set:
                 self.watched_keywords["keywords"].append(keyword)
+                self._kw_set.add(keyword)
             
             if categories:
                 for cat in categories:
-                    if cat and cat not in self.watched_keywords["categories"]:
+                    if cat and cat not in self._cat_set:
                         self.watched_keywords["categories"].append(cat)
+                        self._cat_set.add(cat)
             
-            self._save_watched_keywords()
+            await self._save_watched_keywords()
             logger.info(f"キーワード '{keyword}' を監視リストに追加しました")
             return True
         except Exception as e:
             logger.error(f"キーワード追加エラー: {str(e)}")
             return False
 
-    def remove_watch_keyword(self, keyword: str) -> bool:
+    async def remove_watch_keyword(self, keyword: str) -> bool:
         """
         監視キーワードを削除
         
@@ -134,9 +245,10 @@ class ArxivFetcher:
             bool: 削除に成功したかどうか
         """
         try:
-            if keyword in self.watched_keywords["keywords"]:
+            if keyword in self._kw_set:
                 self.watched_keywords["keywords"].remove(keyword)
-                self._save_watched_keywords()
+                self._kw_set.discard(keyword)
+                await self._save_watched_keywords()
                 logger.info(f"キーワード '{keyword}' を監視リストから削除しました")
                 return True
             else:
@@ -146,67 +258,27 @@ class ArxivFetcher:
             logger.error(f"キーワード削除エラー: {str(e)}")
             return False
 
-    def get_watched_keywords(self) -> Dict[str, List[str]]:
+    def get_watched_keywords(self) -> Mapping[str, List[str]]:
         """
         監視中のキーワード一覧を取得
         
         Returns:
-            Dict[str, List[str]]: キーワードとカテゴリのリスト
+            Mapping[str, List[str]]: キーワードとカテゴリのリスト（読み取り専用）
         """
-        return self.watched_keywords
+        return self._watched_ro
 
-    def _extract_arxiv_id(self, entry_id: str) -> str:
+    def get_watch_version(self) -> int:
         """
-        entry_idからarXiv IDを抽出する
+        監視キーワードのバージョン番号を取得
         
-        Args:
-            entry_id (str): 論文のentry_id
-            
         Returns:
-            str: arXiv ID
+            int: 監視キーワードが変更されるたびに増加する番号
         """
-        # 典型的なentry_idは http://arxiv.org/abs/2401.12345v1 のような形式
-        if entry_id.startswith('http'):
-            arxiv_id = entry_id.split('/')[-1]
-        else:
-            arxiv_id = entry_id
-        return arxiv_id
+        return self._watch_version
 
-    def _generate_arxiv_url(self, entry_id: str) -> str:
-        """
-        arXivのURLを生成する
-        
-        Args:
-            entry_id (str): 論文のentry_id
-            
-        Returns:
-            str: arXivのURL
-        """
-        arxiv_id = self._extract_arxiv_id(entry_id)
-        return f"https://arxiv.org/abs/{arxiv_id}"
-
-    def _prepare_search_query(self, keyword: str, categories: List[str] = None) -> str:
-        """
-        検索クエリを準備する
-        
-        Args:
-            keyword (str): 検索キーワード
-            categories (List[str], optional): 検索対象カテゴリのリスト
-            
-        Returns:
-            str: 検索クエリ文字列
-        """
-        # スペースを含むキーワードはダブルクォートで囲んでフレーズ検索を強制
-        keyword_for_search = f'"{keyword}"' if ' ' in keyword else keyword
-        
-        # カテゴリーフィルターを適用
-        if categories and len(categories) > 0:
-            category_filter = ' OR '.join(f'cat:{cat}' for cat in categories)
-            return f"({keyword_for_search}) AND ({category_filter})"
-        else:
-            return keyword_for_search
-
-    def _convert_paper_to_dict(self, result: arxiv.Result, matched_keyword: str = None) -> Dict[str, Any]:
+    def _convert_paper_to_dict(self,
+                               result: arxiv.Result,
+                               matched_keyword: str = None) -> Dict[str, Any]:
         """
         論文オブジェクトを辞書に変換する
         
@@ -222,11 +294,11 @@ class ArxivFetcher:
         
         paper = {
             "title": result.title,
-            "authors": [author.name for author in result.authors],
+            "authors": list(map(_get_name, result.authors)),
             "summary": result.summary,
             "published": published_date.isoformat(),
             "pdf_url": result.pdf_url,
-            "url": self._generate_arxiv_url(result.entry_id),
+            "url": _generate_arxiv_url(result.entry_id),
             "entry_id": result.entry_id,
             "primary_category": result.primary_category,
             "categories": result.categories
@@ -238,12 +310,57 @@ class ArxivFetcher:
             
         return paper
 
+    @async_retry((arxiv.HTTPError, arxiv.UnexpectedEmptyPageError))
+    async def _fetch_results(self, search: arxiv.Search, since_date: Optional[datetime] = None) -> List[arxiv.Result]:
+        """
+        arXiv APIから検索結果を取得する
+        
+        同時リクエスト数をセマフォで、リクエストの開始間隔をDomainLimiterで制限し、
+        同期処理のarxivクライアントは別スレッドで実行します。
+        一時的なHTTPエラー（429/503など）は指数バックオフでリトライします。
+        
+        Args:
+            search (arxiv.Search): 検索オブジェクト（投稿日の降順でソートされていること）
+            since_date (datetime, optional): この日時より前の論文に到達した時点で取得を打ち切る
+            
+        Returns:
+            List[arxiv.Result]: 検索結果のリスト
+        """
+        def collect() -> List[arxiv.Result]:
+            if since_date is None:
+                return list(self.client.results(search))
+            
+            # 結果は降順のため、基準日時より古い論文が出た時点で残りのページは取得しない
+            # 比較はタイムスタンプ（float）で行い、ループ内でのタイムゾーン変換を避ける
+            since_ts = since_date.timestamp()
+            results = []
+            for result in self.client.results(search):
+                if result.published.timestamp() < since_ts:
+                    # 最新の論文から基準日時より前だった場合は、確認のためその論文の日付を出力
+                    if not results:
+                        published_date = result.published.astimezone(timezone.utc)
+                        logger.info(f"基準日時以降の論文はありません。最新の論文: '{result.title}', 公開日: {published_date.isoformat()}")
+                    break
+                results.append(result)
+            return results
+        
+        async with self._arxiv_sem:
+            async with self._arxiv_limiter:
+                try:
+                    return await asyncio.to_thread(collect)
+                except arxiv.HTTPError as e:
+                    # レート制限に達した場合は他のリクエストも含めて開始を遅らせる
+                    if e.status == 429:
+                        self._arxiv_limiter.pause(self._arxiv_limiter.interval * 10)
+                    raise
+
     @async_error_handler("論文検索")
     async def search_papers(self, 
                     query: str, 
                     max_results: int = 10,
                     categories: Optional[Any] = None,
-                    since_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+                    since_date: Optional[datetime] = None,
+                    skip_cache: bool = False) -> List[Dict[str, Any]]:
         """
         arXivから論文を検索
         
@@ -252,6 +369,7 @@ class ArxivFetcher:
             max_results (int, optional): 取得する最大結果数。デフォルト10
             categories (Any, optional): 検索対象カテゴリのリスト
             since_date (datetime, optional): この日時以降の論文のみ検索
+            skip_cache (bool, optional): Trueの場合は検索結果をキャッシュしない
             
         Returns:
             List[Dict[str, Any]]: 論文情報のリスト
@@ -281,7 +399,8 @@ class ArxivFetcher:
         return await CacheManager.get_or_set_async(
             cache_key,
             lambda: self._search_papers_impl(query, max_results, categories_list, since_date),
-            expire=self.cache_expire
+            expire=self.cache_expire,
+            skip_cache=skip_cache
         )
     
     async def _search_papers_impl(self, 
@@ -290,30 +409,14 @@ class ArxivFetcher:
                     categories: Optional[List[str]] = None,
                     since_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """検索の実装部分"""
-        # スペースを含むクエリはダブルクォートで囲んでフレーズ検索を強制
-        if query and ' ' in query and not (query.startswith('"') and query.endswith('"')):
-            query = f'"{query}"'
-            logger.info(f"フレーズ検索として処理: {query}")
-
-        # categoriesパラメータの処理を強化
-        search_query = query
-        if categories:
-            # 不正な値やオブジェクト表現を排除し、有効なカテゴリIDのみを抽出
-            valid_categories = []
-            for cat in categories:
-                # 文字列化し、標準的なカテゴリIDパターンに一致するもののみを使用
-                cat_str = str(cat).strip()
-                # cs.AI, stat.ML などの一般的なカテゴリID形式をチェック
-                if '.' in cat_str and len(cat_str) < 20 and not ' ' in cat_str:
-                    valid_categories.append(cat_str)
-            
-            # 有効なカテゴリが存在する場合のみフィルタを適用
-            if valid_categories:
-                category_filter = ' OR '.join(f'cat:{cat}' for cat in valid_categories)
-                search_query = f"({query}) AND ({category_filter})"
-                logger.info(f"カテゴリフィルター '{category_filter}' を適用します")
-            else:
-                logger.warning(f"無効なカテゴリが指定されました: {categories}")
+        # クエリ文字列の組み立て（フレーズ検索・カテゴリフィルター）
+        search_query, valid_categories = _build_search_query(
+            query, tuple(str(cat) for cat in categories) if categories else None
+        )
+        if valid_categories:
+            logger.info(f"カテゴリフィルター {list(valid_categories)} を適用します")
+        elif categories:
+            logger.warning(f"無効なカテゴリが指定されました: {categories}")
 
         # 日付による絞り込みのログ出力
         if since_date:
@@ -339,111 +442,25 @@ class ArxivFetcher:
             sort_order=arxiv.SortOrder.Descending
         )
 
-        # 検索を実行して結果を取得
+        # 検索を実行して結果を取得（イベントループをブロックしないよう別スレッドで実行）
         try:
-            results = list(self.client.results(search))
+            results = await self._fetch_results(search, since_date)
             logger.info(f"arXiv APIから {len(results)} 件の論文を取得しました")
         except Exception as e:
             logger.error(f"arXiv APIの検索中にエラーが発生しました: {str(e)}")
             return []
         
-        # 結果を処理
-        papers = []
-        filtered_count = 0
-        
-        # 日付のフィルタリング
-        for result in results:
-            published_date = result.published.astimezone(timezone.utc)
-            
-            # 日付によるフィルタリング - 指定日以降の論文のみ
-            if since_date:
-                # ここでは「指定日より前」の論文をスキップ
-                if published_date < since_date:
-                    filtered_count += 1
-                    # 詳細なデバッグログ
-                    if filtered_count <= 5:  # 最初の5件だけログ出力
-                        logger.debug(f"日付フィルター: 除外された論文 '{result.title}', 公開日: {published_date.isoformat()}")
-                    continue
-            
-            # 条件を満たす論文を結果に追加
-            paper = self._convert_paper_to_dict(result)
-            papers.append(paper)
-        
-        if filtered_count > 0:
-            logger.info(f"日付フィルターにより {filtered_count} 件の論文が除外されました")
+        # 基準日時より前の論文は取得時に打ち切り済みのため、そのまま変換する
+        papers = [self._convert_paper_to_dict(result) for result in results]
         
         logger.info(f"検索クエリ '{search_query}' に一致する論文が {len(papers)} 件見つかりました")
         
         # 結果が0件の場合、詳細情報をログに出力
         if len(papers) == 0:
             logger.warning(f"検索結果が0件です。クエリ: '{search_query}', 日付指定: {since_date.isoformat() if since_date else '指定なし'}")
-            # APIからは論文が取得できたが、フィルターで除外された場合
-            if len(results) > 0:
-                logger.warning(f"API検索自体では {len(results)} 件ありましたが、フィルターで全て除外されました")
-                # 念のため、最初の数件の論文の日付を出力
-                for i, result in enumerate(results[:3]):
-                    published_date = result.published.astimezone(timezone.utc)
-                    logger.warning(f"  除外された論文 #{i+1}: '{result.title}', 公開日: {published_date.isoformat()}")
         
         return papers
 
-    @async_error_handler("新規論文チェック")
-    async def check_new_papers(self) -> List[Dict[str, Any]]:
-        """
-        監視中のキーワードに関連する新規論文をチェック
-        
-        Returns:
-            List[Dict[str, Any]]: 新規論文情報のリスト
-        """
-        last_check = self._load_last_check()
-        watched_keywords = self.get_watched_keywords()
-        
-        if not watched_keywords["keywords"]:
-            logger.info("監視キーワードが設定されていません")
-            return []
-        
-        all_papers = []
-        newest_paper_date = None
-        
-        for keyword in watched_keywords["keywords"]:
-            # キーワードごとに検索
-            search_query = self._prepare_search_query(keyword, watched_keywords.get("categories"))
-            
-            search = arxiv.Search(
-                query=search_query,
-                max_results=50,
-                sort_by=arxiv.SortCriterion.SubmittedDate,
-                sort_order=arxiv.SortOrder.Descending
-            )
-            
-            results = list(self.client.results(search))
-            
-            # 各論文をフィルタリング
-            for result in results:
-                # 日付をUTCタイムゾーンで保持
-                paper_date = result.published.astimezone(timezone.utc)
-                
-                # last_checkより後の論文のみを処理
-                if paper_date > last_check:
-                    # 最新の論文日時を更新
-                    if newest_paper_date is None or paper_date > newest_paper_date:
-                        newest_paper_date = paper_date
-                        
-                    # 重複チェック
-                    if not any(p["entry_id"] == result.entry_id for p in all_papers):
-                        paper = self._convert_paper_to_dict(result, keyword)
-                        logger.info(f"新しい論文が見つかりました: {result.title}, 公開日: {paper_date.isoformat()}, キーワード: {keyword}")
-                        all_papers.append(paper)
-        
-        # 最終チェック日時を更新
-        if newest_paper_date:
-            self._save_last_check(newest_paper_date)
-        elif all_papers:
-            self._save_last_check()
-        
-        logger.info(f"監視キーワードに一致する新しい論文が {len(all_papers)} 件見つかりました")
-        return all_papers
-
     def get_categories(self) -> Dict[str, Any]:
         """
         利用可能なカテゴリー一覧を返す
@@ -457,16 +474,19 @@ class ArxivFetcher:
         """
         最終チェック日時を取得
         
+        ファイルが外部から更新された場合のみ読み直し、それ以外はメモリ上の値を返します。
+        
         Returns:
             datetime: 最終チェック日時
         """
-        return self._load_last_check()
+        self.last_check = self._load_last_check()
+        return self.last_check
 
-    def update_last_check(self):
+    async def update_last_check(self):
         """最終チェック日時を現在時刻で更新"""
-        self._save_last_check()
+        await self._save_last_check()
 
-    def update_last_check_with_date(self, date: Union[datetime, str]):
+    async def update_last_check_with_date(self, date: Union[datetime, str]):
         """
         指定された日時で最終チェック日時を更新
         
@@ -475,4 +495,4 @@ class ArxivFetcher:
         """
         if isinstance(date, str):
             date = datetime.fromisoformat(date)
-        self._save_last_check(date)
\ No newline at end of file
+        await self._save_last_check(date)
\ No newline at end of file
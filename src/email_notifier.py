@@ -1,9 +1,11 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from collections import defaultdict
 from datetime import datetime
 import os
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import aiosmtplib
+from jinja2 import Template
 from pydantic import BaseModel, EmailStr
 from pathlib import Path
 import json
@@ -12,6 +14,38 @@ from .utils import setup_logger, ConfigManager
 # 共通ロギング設定を使用
 logger = setup_logger("email_notifier")
 
+# 通知メールのHTMLテンプレート（モジュール読み込み時に一度だけコンパイルする）
+EMAIL_TEMPLATE = Template("""
+            <html>
+            <head>
+                <style>
+                    .paper { margin-bottom: 20px; padding: 10px; border: 1px solid #ddd; }
+                    .title { font-size: 18px; color: #2c3e50; margin-bottom: 10px; }
+                    .meta { color: #666; font-size: 14px; margin-bottom: 10px; }
+                    .summary { background-color: #f8f9fa; padding: 10px; border-radius: 4px; }
+                </style>
+            </head>
+            <body>
+                <h1>新着論文のお知らせ</h1>
+            {% for date, date_papers in papers_by_date %}<h2>{{ date.strftime('%Y年%m月%d日') }}</h2>{% for paper in date_papers %}
+                    <div class="paper">
+                        <div class="title">{{ paper.title }}</div>
+                        {% if paper.title_ja and paper.title_ja != paper.title %}<div class="title-ja">{{ paper.title_ja }}</div>{% endif %}
+                        <div class="meta">
+                            著者: {{ paper.authors | join(', ') }}<br>
+                            カテゴリー: {{ paper.primary_category }}
+                        </div>
+                        <div class="summary">
+                            <h3>要約:</h3>
+                            <p>{{ paper.summary_ja | default('要約なし') }}</p>
+                        </div>
+                        <p><a href="{{ paper.pdf_url or '' }}" target="_blank">PDF を開く</a></p>
+                    </div>
+                    {% endfor %}{% endfor %}
+                </body>
+            </html>
+            """, autoescape=True)
+
 class EmailConfig(BaseModel):
     smtp_server: str
     smtp_port: int
@@ -24,6 +58,9 @@ class EmailNotifier:
     def __init__(self):
         self.config_file = "data/email_config.json"
         self.config = self._load_config()
+        # 送信ごとのTLSハンドシェイク・ログインを避けるため、SMTP接続を使い回す
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._smtp_config: Optional[EmailConfig] = None
 
     def _load_config(self) -> EmailConfig:
         """メール設定を読み込む"""
@@ -32,9 +69,49 @@ class EmailNotifier:
 
     def save_config(self, config: Dict[str, Any]):
         """メール設定を保存"""
-        ConfigManager.save_json(self.config_file, config)
+        ConfigManager.save_json(self.config_file, config, durable=True)
         self.config = EmailConfig(**config)
 
+    async def _get_smtp(self) -> aiosmtplib.SMTP:
+        """
+        ログイン済みのSMTP接続を取得する
+        
+        接続が切れている場合や設定が変更された場合は接続し直します。
+        
+        Returns:
+            aiosmtplib.SMTP: ログイン済みのSMTPクライアント
+        """
+        if self._smtp is not None and (self._smtp_config != self.config or not self._smtp.is_connected):
+            await self.close()
+        
+        if self._smtp is None:
+            smtp = aiosmtplib.SMTP(
+                hostname=self.config.smtp_server,
+                port=self.config.smtp_port,
+                use_tls=True
+            )
+            await smtp.connect()
+            try:
+                await smtp.login(self.config.username, self.config.password)
+            except Exception:
+                smtp.close()
+                raise
+            self._smtp = smtp
+            self._smtp_config = self.config
+        
+        return self._smtp
+
+    async def close(self):
+        """SMTP接続を閉じる"""
+        smtp, self._smtp, self._smtp_config = self._smtp, None, None
+        if smtp is None:
+            return
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
     async def send_notification(self, papers: List[Dict[str, Any]]):
         """新着論文の通知メールを送信"""
         if not self.config or not papers:
@@ -42,67 +119,32 @@ class EmailNotifier:
 
         try:
             # 日付でグループ化
-            papers_by_date = {}
+            papers_by_date = defaultdict(list)
             for paper in papers:
-                date = datetime.fromisoformat(paper['published']).date()
-                if date not in papers_by_date:
-                    papers_by_date[date] = []
-                papers_by_date[date].append(paper)
+                papers_by_date[datetime.fromisoformat(paper['published']).date()].append(paper)
 
             # メール本文を作成
-            html_content = """
-            <html>
-            <head>
-                <style>
-                    .paper { margin-bottom: 20px; padding: 10px; border: 1px solid #ddd; }
-                    .title { font-size: 18px; color: #2c3e50; margin-bottom: 10px; }
-                    .meta { color: #666; font-size: 14px; margin-bottom: 10px; }
-                    .summary { background-color: #f8f9fa; padding: 10px; border-radius: 4px; }
-                </style>
-            </head>
-            <body>
-                <h1>新着論文のお知らせ</h1>
-            """
-
-            for date, date_papers in sorted(papers_by_date.items(), reverse=True):
-                html_content += f"<h2>{date.strftime('%Y年%m月%d日')}</h2>"
-                for paper in date_papers:
-                    html_content += f"""
-                    <div class="paper">
-                        <div class="title">{paper['title']}</div>
-                        {f'<div class="title-ja">{paper["title_ja"]}</div>' if 'title_ja' in paper and paper['title_ja'] != paper['title'] else ''}
-                        <div class="meta">
-                            著者: {', '.join(paper['authors'])}<br>
-                            カテゴリー: {paper['primary_category']}
-                        </div>
-                        <div class="summary">
-                            <h3>要約:</h3>
-                            <p>{paper.get('summary_ja', '要約なし')}</p>
-                        </div>
-                        <p><a href="{paper['pdf_url']}" target="_blank">PDF を開く</a></p>
-                    </div>
-                    """
-
-            html_content += """
-                </body>
-            </html>
-            """
+            html_content = EMAIL_TEMPLATE.render(
+                papers_by_date=sorted(papers_by_date.items(), reverse=True)
+            )
 
             message = MIMEMultipart()
             message["Subject"] = f"新着論文のお知らせ ({len(papers)}件)"
             message["From"] = self.config.from_email
-            message["To"] = ", ".join(self.config.to_emails)
+            # 宛先はヘッダーに載せずエンベロープのみで指定する（BCC相当）
+            message["To"] = "undisclosed-recipients:;"
 
             message.attach(MIMEText(html_content, "html"))
+            raw_message = message.as_bytes()
 
-            # メール送信
-            async with aiosmtplib.SMTP(
-                hostname=self.config.smtp_server,
-                port=self.config.smtp_port,
-                use_tls=True
-            ) as smtp:
-                await smtp.login(self.config.username, self.config.password)
-                await smtp.send_message(message)
+            # メール送信（サーバー側で接続が切られていた場合は一度だけ再接続する）
+            smtp = await self._get_smtp()
+            try:
+                await smtp.sendmail(self.config.from_email, self.config.to_emails, raw_message)
+            except aiosmtplib.SMTPServerDisconnected:
+                await self.close()
+                smtp = await self._get_smtp()
+                await smtp.sendmail(self.config.from_email, self.config.to_emails, raw_message)
 
             logger.info(f"Sent notification email for {len(papers)} papers")
 
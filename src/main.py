@@ -1,19 +1,35 @@
 import asyncio
-import json
+import functools
 import os
 from .arxiv_fetcher import ArxivFetcher
-from .paper_summarizer import PaperSummarizer
+from .paper_summarizer import PaperSummarizer, FATAL_ERRORS
 from .email_notifier import EmailNotifier
-from typing import List, Dict, Any, Optional, Union
-from loguru import logger
+from .utils import setup_logger
+from typing import List, Dict, Any, Optional, Union, Callable, Awaitable, Mapping
 from datetime import datetime, timezone, timedelta
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # 定数
 CHECK_INTERVAL = 3600  # 1時間ごとにチェック
 
-# ロガーの設定
-logger.add("logs/main.log", rotation="500 MB")
+# 共通ロギング設定を使用
+logger = setup_logger("main")
+
+@functools.lru_cache(maxsize=4096)
+def _to_utc_date(iso: str) -> str:
+    """
+    ISO形式の日時文字列をUTCの日付文字列（YYYY-MM-DD）に変換
+    
+    Args:
+        iso (str): ISO形式の日時文字列
+        
+    Returns:
+        str: UTCの日付文字列
+    """
+    # 既にUTCの場合は先頭の日付部分をそのまま使用
+    if iso.endswith("Z") or iso.endswith("+00:00"):
+        return iso[:10]
+    return datetime.fromisoformat(iso).astimezone(timezone.utc).strftime('%Y-%m-%d')
 
 class PaperService:
     def __init__(self):
@@ -22,6 +38,15 @@ class PaperService:
         self.notifier = EmailNotifier()
         self.scheduler = AsyncIOScheduler()
         
+        # 実行中の処理（同一キーの同時呼び出しは1つの処理を共有する）
+        self._inflight: Dict[str, asyncio.Task] = {}
+        
+        # 実行中の新規論文チェックの状態（途中から通知を依頼できるようにする）
+        self._check_states: Dict[str, Dict[str, bool]] = {}
+        
+        # 要約処理（OpenAI API呼び出し）の同時実行数
+        self._summarize_sem = asyncio.Semaphore(int(os.getenv("SUMMARIZE_CONCURRENCY", "8")))
+        
         # スケジューラーの設定（毎日午前1時に実行）
         self.scheduler.add_job(
             self.check_and_notify,
@@ -46,18 +71,38 @@ class PaperService:
     async def check_and_notify(self):
         """新規論文をチェックしてメール通知"""
         try:
-            papers_dict = await self.check_new_papers()
-            if papers_dict and len(papers_dict) > 0:
-                # 辞書からリストに変換
-                all_papers = []
-                for keyword, papers_list in papers_dict.items():
-                    all_papers.extend(papers_list)
-                
-                if all_papers:
-                    await self.notifier.send_notification(all_papers)
+            # キーワードごとに要約が完了した時点で通知を送信する
+            # （画面からのチェックが実行中の場合はその処理に通知を依頼する）
+            await self.check_new_papers(notify=True)
         except Exception as e:
             logger.error(f"Error in scheduled check: {str(e)}")
 
+    async def _single_flight(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        同じキーの処理が実行中であればその結果を待ち、なければ新たに実行する
+        
+        Args:
+            key (str): 処理を識別するキー
+            func (Callable[[], Awaitable[Any]]): 実行する非同期関数
+            
+        Returns:
+            Any: 処理結果
+        """
+        task = self._inflight.get(key)
+        if task is None or task.done():
+            task = asyncio.ensure_future(func())
+            self._inflight[key] = task
+            
+            def _cleanup(finished: asyncio.Task):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+            task.add_done_callback(_cleanup)
+        else:
+            logger.info(f"実行中の処理を共有します: {key}")
+        
+        # 呼び出し元がキャンセルされても共有中の処理は継続させる
+        return await asyncio.shield(task)
+
     def save_email_config(self, config: Dict[str, Any]):
         """メール設定を保存"""
         self.notifier.save_config(config)
@@ -72,62 +117,63 @@ class PaperService:
         """
         論文リストに対して日本語要約を生成する共通処理
         
+        論文の辞書はコピーせず、title_ja・summary_jaをその場で追加する
+        
         Args:
             papers (List[Dict[str, Any]]): 要約する論文のリスト
             use_japanese_summary (bool): 日本語要約を生成するかどうか
             
         Returns:
-            List[Dict[str, Any]]: 要約を追加した論文リスト
+            List[Dict[str, Any]]: 要約を追加した論文リスト（入力と同じ辞書）
         """
         if not papers:
             return []
             
-        results = []
-        for paper in papers:
-            paper_result = paper.copy()
-            
-            # 日本語要約が必要な場合のみ要約処理を行う
-            if use_japanese_summary:
+        # 日本語要約が不要な場合は要約処理をスキップ
+        if not use_japanese_summary:
+            for paper in papers:
+                logger.info(f"論文「{paper['title']}」の日本語要約・タイトルはスキップします")
+            return papers
+        
+        async def _one_batch(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            # 同時に実行する要約処理の数をセマフォで制限する
+            async with self._summarize_sem:
                 try:
-                    logger.info(f"論文「{paper['title']}」の日本語要約・タイトルを生成します")
-                    
-                    # キャッシュがあるかチェックし、あれば使用
-                    if hasattr(self.summarizer, 'cache') and self.summarizer.cache:
-                        cache_key = paper.get("entry_id", None)
-                        if cache_key:
-                            cached_result = self.summarizer.cache.get(cache_key)
-                            if cached_result:
-                                paper_result["title_ja"] = cached_result.get("title_ja", paper["title"])
-                                paper_result["summary_ja"] = cached_result.get("summary_ja", "")
-                                logger.info(f"キャッシュから日本語タイトル・要約を取得しました")
-                                results.append(paper_result)
-                                continue
+                    logger.info(f"{len(batch)}件の論文の日本語要約・タイトルを生成します")
                     
-                    # 日本語要約処理を実行
-                    summary = await self.summarizer.summarize(paper)
-                    title_ja = summary.get("title_ja", paper["title"])
-                    summary_ja = summary.get("summary_ja", "要約の生成に失敗しました。")
-                    
-                    paper_result.update({
-                        "title_ja": title_ja,
-                        "summary_ja": summary_ja
-                    })
+                    # 複数の論文を1回のAPI呼び出しでまとめて要約（キャッシュ済みの論文はキャッシュを使用）
+                    summaries = await self.summarizer.summarize_batch(batch)
+                    for paper, summary in zip(batch, summaries):
+                        paper.update({
+                            "title_ja": summary.get("title_ja", paper["title"]),
+                            "summary_ja": summary.get("summary_ja", "要約の生成に失敗しました。")
+                        })
                     
                     logger.info(f"日本語タイトル・要約の生成完了")
                     
+                except FATAL_ERRORS:
+                    raise
                 except Exception as e:
                     logger.error(f"要約生成エラー: {str(e)}")
-                    paper_result.update({
-                        "title_ja": paper["title"],  # エラー時は英語タイトルをそのまま使用
-                        "summary_ja": "要約の生成に失敗しました。"
-                    })
-            else:
-                # 日本語要約が不要な場合は要約処理をスキップ
-                logger.info(f"論文「{paper['title']}」の日本語要約・タイトルはスキップします")
-                
-            results.append(paper_result)
+                    for paper in batch:
+                        paper.update({
+                            "title_ja": paper["title"],  # エラー時は英語タイトルをそのまま使用
+                            "summary_ja": "要約の生成に失敗しました。"
+                        })
             
-        return results
+            return batch
+        
+        # 論文をまとめ単位に分割して並行実行
+        # 致命的なエラーが発生した場合はTaskGroupにより残りの要約処理がキャンセルされる
+        batch_size = self.summarizer.batch_size
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for i in range(0, len(papers), batch_size):
+                    tg.create_task(_one_batch(papers[i:i + batch_size]))
+        except* FATAL_ERRORS as eg:
+            # ExceptionGroupに包まず、元のエラーを呼び出し元へ伝える
+            raise eg.exceptions[0]
+        return papers
 
     async def search_and_summarize(self, 
                            query: str, 
@@ -136,6 +182,19 @@ class PaperService:
                            use_japanese_summary: bool = True,
                            since_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
         """論文を検索し、要約を生成"""
+        key = f"search_{query}_{max_results}_{categories}_{use_japanese_summary}_{since_date.isoformat() if since_date else 'None'}"
+        return await self._single_flight(
+            key,
+            lambda: self._search_and_summarize_impl(query, max_results, categories, use_japanese_summary, since_date)
+        )
+
+    async def _search_and_summarize_impl(self, 
+                                   query: str, 
+                                   max_results: int = 50,
+                                   categories: Optional[List[str]] = None,
+                                   use_japanese_summary: bool = True,
+                                   since_date: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """検索・要約の実装部分"""
         try:
             # 論文検索を実行
             papers = await self.fetcher.search_papers(query, max_results, categories, since_date)
@@ -152,18 +211,22 @@ class PaperService:
             logger.error(f"検索・要約処理エラー: {str(e)}")
             raise
 
-    def add_watch_keyword(self, keyword: str, categories: Optional[List[str]] = None):
+    async def add_watch_keyword(self, keyword: str, categories: Optional[List[str]] = None) -> bool:
         """監視キーワードを追加"""
-        self.fetcher.add_watch_keyword(keyword, categories)
+        return await self.fetcher.add_watch_keyword(keyword, categories)
 
-    def remove_watch_keyword(self, keyword: str):
+    async def remove_watch_keyword(self, keyword: str):
         """監視キーワードを削除"""
-        self.fetcher.remove_watch_keyword(keyword)
+        await self.fetcher.remove_watch_keyword(keyword)
 
-    def get_watched_keywords(self) -> Dict[str, List[str]]:
+    def get_watched_keywords(self) -> Mapping[str, List[str]]:
         """監視中のキーワード一覧を取得"""
         return self.fetcher.get_watched_keywords()
 
+    def get_watch_version(self) -> int:
+        """監視キーワードのバージョン番号を取得"""
+        return self.fetcher.get_watch_version()
+
     def group_papers_by_date_and_keyword(self, papers: List[Dict[str, Any]], keywords: List[str]) -> Dict[str, Dict[str, List[Dict[str, Any]]]]:
         """論文を日付とキーワードでグループ化"""
         grouped = {}
@@ -175,30 +238,57 @@ class PaperService:
         displayed_paper_ids = set()
             
         for paper in papers:
-            # 日付の取得とフォーマット（タイムゾーン情報を保持）
-            published_date = datetime.fromisoformat(paper['published'])
-            date = published_date.astimezone(timezone.utc).strftime('%Y-%m-%d')
+            # 日付の取得とフォーマット（UTC基準）
+            date = _to_utc_date(paper['published'])
             
             # 論文のキーワードを取得（新しい実装では既にmatched_keywordが設定されている）
             keyword = paper.get('matched_keyword', 'その他の論文')
             
-            # 日付グループの追加
-            if date not in grouped:
-                grouped[date] = {}
-            if keyword not in grouped[date]:
-                grouped[date][keyword] = []
+            # 日付・キーワードのグループを取得（なければ作成）
+            group = grouped.setdefault(date, {}).setdefault(keyword, [])
             
             # 論文IDを確認して重複を防止
             paper_id = paper.get('entry_id', '')
             if paper_id not in displayed_paper_ids:
-                grouped[date][keyword].append(paper)
+                group.append(paper)
                 displayed_paper_ids.add(paper_id)
         
         # 日付でソート（新しい順）
         return dict(sorted(grouped.items(), reverse=True))
 
-    async def check_new_papers(self, use_japanese_summary: bool = True) -> Dict[str, List[Dict[str, Any]]]:
-        """キーワードごとの新しい論文をチェックして要約する"""
+    async def check_new_papers(self,
+                               use_japanese_summary: bool = True,
+                               notify: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        キーワードごとの新しい論文をチェックして要約する（同時呼び出しは1回の処理にまとめる）
+        
+        Args:
+            use_japanese_summary (bool): 日本語要約を生成するかどうか
+            notify (bool): キーワードごとに要約が完了した時点でメール通知するかどうか
+                （実行中のチェックに合流した場合は、その処理に未通知分の通知を依頼する）
+            
+        Returns:
+            Dict[str, List[Dict[str, Any]]]: キーワードごとの論文リスト
+        """
+        key = f"new_papers_{use_japanese_summary}"
+        
+        state = self._check_states.get(key)
+        if notify and state is not None:
+            # 実行中のチェックに通知を依頼する（別のチェックは開始しない）
+            state["notify"] = True
+        
+        def _start() -> Awaitable[Dict[str, List[Dict[str, Any]]]]:
+            new_state = {"notify": notify}
+            self._check_states[key] = new_state
+            return self._check_new_papers_impl(key, new_state, use_japanese_summary)
+        
+        return await self._single_flight(key, _start)
+
+    async def _check_new_papers_impl(self,
+                                     key: str,
+                                     state: Dict[str, bool],
+                                     use_japanese_summary: bool = True) -> Dict[str, List[Dict[str, Any]]]:
+        """新しい論文のチェックの実装部分"""
         try:
             # 監視キーワードとカテゴリを読み込み
             watched_keywords = self._load_watched_keywords()
@@ -211,42 +301,115 @@ class PaperService:
             current_time = datetime.now(timezone.utc)
             
             results = {}
+            # 要約済みで通知がまだのキーワードと論文
+            unnotified = []
             # watched_keywordsの構造は {"keywords": [...], "categories": [...]} の形式
             if "keywords" in watched_keywords and watched_keywords["keywords"]:
-                keywords_list = watched_keywords["keywords"]
-                categories_list = watched_keywords.get("categories", [])
+                # 検索中に監視キーワードが変更されても対応がずれないよう、リストを複製して使用する
+                keywords_list = list(watched_keywords["keywords"])
+                categories_list = list(watched_keywords.get("categories", []))
                 
-                for keyword in keywords_list:
-                    # キーワードに対する新しい論文を検索
-                    papers = await self.fetcher.search_papers(
+                # キーワードごとの検索を並行実行
+                # （arXivへの同時接続数と間隔はArxivFetcher側で制限している）
+                papers_per_keyword = await asyncio.gather(*(
+                    self.fetcher.search_papers(
                         keyword, 
                         max_results=50,  # デフォルトの最大結果数
                         categories=categories_list if categories_list else None,
-                        since_date=last_check_date
+                        since_date=last_check_date,
+                        # 基準日時はチェックごとに更新されるため、同じキーで再利用されることはない
+                        skip_cache=True
                     )
-                    
+                    for keyword in keywords_list
+                ))
+                
+                found = []
+                # 複数のキーワードに一致した論文は最初のキーワードでのみ要約する
+                owned = []
+                seen_ids = set()
+                for keyword, papers in zip(keywords_list, papers_per_keyword):
                     if papers:
                         logger.info(f"キーワード '{keyword}' に一致する新しい論文が {len(papers)} 件見つかりました")
+                        found.append((keyword, papers))
                         
-                        # 共通要約処理で論文を処理
-                        summarized_papers = await self._generate_summary_for_papers(papers, use_japanese_summary)
-                        
-                        results[keyword] = summarized_papers
+                        new_papers = []
+                        for paper in papers:
+                            if paper["entry_id"] in seen_ids:
+                                continue
+                            seen_ids.add(paper["entry_id"])
+                            paper["matched_keyword"] = keyword
+                            new_papers.append(paper)
+                        if new_papers:
+                            owned.append((keyword, new_papers))
                     else:
                         logger.info(f"キーワード '{keyword}' に一致する新しい論文は見つかりませんでした")
+                
+                async def _summarize_keyword(keyword: str, papers: List[Dict[str, Any]]):
+                    return keyword, await self._generate_summary_for_papers(papers, use_japanese_summary)
+                
+                # 共通要約処理で論文を処理（同時実行数は要約用セマフォで制限される）
+                # 完了したキーワードから順に通知し、メール送信と残りの要約処理を並行させる
+                summarized_by_id = {}
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [tg.create_task(_summarize_keyword(k, p)) for k, p in owned]
+                        for next_done in asyncio.as_completed(tasks):
+                            keyword, summarized_papers = await next_done
+                            for paper in summarized_papers:
+                                summarized_by_id[paper["entry_id"]] = paper
+                            unnotified.append((keyword, summarized_papers))
+                            if state["notify"]:
+                                await self._notify_keywords(unnotified)
+                except* FATAL_ERRORS as eg:
+                    # ExceptionGroupに包まず、元のエラーを呼び出し元へ伝える
+                    raise eg.exceptions[0]
+                
+                # 要約結果をキーワードごとに割り当て直す（結果は監視キーワードの順序で返す）
+                for keyword, papers in found:
+                    keyword_papers = []
+                    for paper in papers:
+                        summarized_paper = summarized_by_id[paper["entry_id"]]
+                        if summarized_paper.get("matched_keyword") != keyword:
+                            summarized_paper = dict(summarized_paper, matched_keyword=keyword)
+                        keyword_papers.append(summarized_paper)
+                    results[keyword] = keyword_papers
             else:
                 logger.info("監視キーワードが設定されていません")
             
             # 最終チェック日時を更新
-            self._save_last_check_date(current_time)
+            await self._save_last_check_date(current_time)
+            
+            # 処理の途中で通知を依頼された場合は未通知分をまとめて送信する
+            # （判定から処理の終了までに待機を挟まないため、依頼の取りこぼしはない）
+            if state["notify"]:
+                await self._notify_keywords(unnotified)
             
             return results
 
         except Exception as e:
             logger.error(f"新しい論文のチェックエラー: {str(e)}")
             raise
+        finally:
+            if self._check_states.get(key) is state:
+                del self._check_states[key]
+
+    async def _notify_keywords(self, unnotified: List[tuple]):
+        """
+        要約済みの論文をキーワードごとにメール通知する
+        
+        Args:
+            unnotified (List[tuple]): (キーワード, 論文リスト)のリスト（送信済みの要素は取り除かれる）
+        """
+        while unnotified:
+            keyword, papers = unnotified.pop(0)
+            if not papers:
+                continue
+            try:
+                await self.notifier.send_notification(papers)
+            except Exception as e:
+                logger.error(f"キーワード '{keyword}' の通知送信エラー: {str(e)}")
 
-    def _load_watched_keywords(self) -> Dict[str, Union[List[str], List[Dict[str, Any]]]]:
+    def _load_watched_keywords(self) -> Mapping[str, Union[List[str], List[Dict[str, Any]]]]:
         """監視キーワードを読み込む"""
         return self.fetcher.get_watched_keywords()
         
@@ -254,9 +417,9 @@ class PaperService:
         """最終チェック日時を読み込む"""
         return self.fetcher.load_last_check()
         
-    def _save_last_check_date(self, date: datetime):
+    async def _save_last_check_date(self, date: datetime):
         """最終チェック日時を保存する"""
-        self.fetcher.update_last_check_with_date(date)
+        await self.fetcher.update_last_check_with_date(date)
 
 async def main():
     """メインの非同期処理"""
@@ -1,24 +1,133 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
 import os
-from openai import AsyncOpenAI
+import httpx
+import orjson
+from openai import AsyncOpenAI, AuthenticationError, PermissionDeniedError
 from dotenv import load_dotenv
 from diskcache import Cache
-from .utils import setup_logger
+from .utils import setup_logger, OrjsonDisk, CACHE_SETTINGS
 
 # 共通ロギング設定を使用
 logger = setup_logger("paper_summarizer")
 
+# .envの読み込みと設定値の取得はモジュール読み込み時に一度だけ行う
+# （APIキーは設定の変更を反映できるよう、PaperSummarizerの生成時に取得する）
+load_dotenv()
+TEST_MODE = os.getenv("TEST_MODE", "false").lower() == "true"
+
+# 再試行しても成功しない致命的なエラー（APIキーの失効など）
+# 要約のフォールバックにせず呼び出し元に伝播させ、残りの要約処理を中断させる
+FATAL_ERRORS = (AuthenticationError, PermissionDeniedError)
+
+# モデルの1回の応答で生成できるトークン数の上限
+MAX_OUTPUT_TOKENS = 4096
+
+# プロセス全体で共有するOpenAIクライアント（APIキーごとに初回利用時に生成）
+_openai_clients: Dict[str, AsyncOpenAI] = {}
+
+def _get_openai_client(api_key: str) -> AsyncOpenAI:
+    """
+    共有のOpenAIクライアントを取得（接続プールを全ての要約処理で再利用する）
+
+    Args:
+        api_key (str): OpenAI APIキー
+
+    Returns:
+        AsyncOpenAI: OpenAIクライアント
+    """
+    client = _openai_clients.get(api_key)
+    if client is None:
+        client = AsyncOpenAI(
+            api_key=api_key,
+            http_client=httpx.AsyncClient(
+                http2=True,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+                timeout=60
+            )
+        )
+        _openai_clients[api_key] = client
+    return client
+
+async def close_openai_clients():
+    """共有のOpenAIクライアントの接続をすべて閉じる（アプリケーション終了時に呼び出す）"""
+    clients = list(_openai_clients.values())
+    _openai_clients.clear()
+    for client in clients:
+        await client.close()
+
+def _max_tokens_for(paper: Dict[str, Any]) -> int:
+    """
+    アブストラクトの長さに応じた生成トークン数の上限を計算
+
+    Args:
+        paper (Dict[str, Any]): 論文データ（summaryが必要）
+
+    Returns:
+        int: max_tokensに指定する値
+    """
+    # 日本語訳は英語の単語数よりトークン数が大幅に多くなるため、文字数を基準に余裕を持たせる
+    # （従来の固定値1000を下限とし、長いアブストラクトでもJSONが途中で切れないようにする）
+    return max(1000, min(2000, len(paper["title"]) + len(paper["summary"]) + 200))
+
 class PaperSummarizer:
     def __init__(self):
-        load_dotenv()
-        self.test_mode = os.getenv("TEST_MODE", "false").lower() == "true"
-        # 重複した設定を削除
+        self.test_mode = TEST_MODE
         if not self.test_mode:
             api_key = os.getenv("OPENAI_API_KEY")
             if not api_key:
                 raise ValueError("OPENAI_API_KEYが設定されていません")
-            self.client = AsyncOpenAI(api_key=api_key)
-        self.cache = Cache("cache")
+            self.client = _get_openai_client(api_key)
+        # 要約結果はJSONで表現できる辞書のみのため、pickleより高速なorjsonで保存する
+        # （pickle形式の検索キャッシュと混在しないよう専用のディレクトリを使用）
+        self.cache = Cache("cache/summaries", disk=OrjsonDisk, **CACHE_SETTINGS)
+        # ディスクキャッシュの前段に置くプロセス内LRUキャッシュ
+        self._mem: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._mem_max = int(os.getenv("SUMMARY_MEMORY_CACHE_SIZE", "1024"))
+        # 1回のAPI呼び出しでまとめて要約する論文の最大数
+        self.batch_size = max(1, int(os.getenv("SUMMARIZE_BATCH_SIZE", "5")))
+
+    async def close(self):
+        """OpenAI APIへの接続を閉じる"""
+        await close_openai_clients()
+
+    def _get_cached(self, cache_key: str) -> Optional[Dict[str, str]]:
+        """
+        キャッシュ済みの要約を取得（メモリ→ディスクの順に参照）
+
+        Args:
+            cache_key (str): キャッシュキー（entry_id）
+
+        Returns:
+            Optional[Dict[str, str]]: キャッシュされた要約結果（なければNone）
+        """
+        result = self._mem.get(cache_key)
+        if result is not None:
+            self._mem.move_to_end(cache_key)
+            return result
+
+        result = self.cache.get(cache_key)
+        if result is not None:
+            self._remember(cache_key, result)
+        return result
+
+    def _set_cached(self, cache_key: str, result: Dict[str, str]):
+        """
+        要約をメモリとディスクの両方にキャッシュ
+
+        Args:
+            cache_key (str): キャッシュキー（entry_id）
+            result (Dict[str, str]): 要約結果
+        """
+        self.cache.set(cache_key, result)
+        self._remember(cache_key, result)
+
+    def _remember(self, cache_key: str, result: Dict[str, str]):
+        """メモリ上のLRUキャッシュに追加し、上限を超えた古いエントリを削除"""
+        self._mem[cache_key] = result
+        self._mem.move_to_end(cache_key)
+        if len(self._mem) > self._mem_max:
+            self._mem.popitem(last=False)
 
     async def summarize(self, paper: Dict[str, Any]) -> Dict[str, str]:
         """
@@ -38,7 +147,7 @@ class PaperSummarizer:
         cache_key = paper["entry_id"] if "entry_id" in paper else None
         
         if cache_key:
-            cached_result = self.cache.get(cache_key)
+            cached_result = self._get_cached(cache_key)
             if cached_result is not None:
                 logger.info(f"Cache hit for paper: {paper['title']}")
                 return cached_result
@@ -55,9 +164,8 @@ class PaperSummarizer:
             user_prompt = f"""タイトル：{paper['title']}
 アブストラクト：{paper['summary']}
 
-以下の形式で必ず回答してください：
-タイトル：[論文タイトルの日本語訳]
-要約：[アブストラクトの日本語要約]"""
+以下のJSON形式で必ず回答してください：
+{{"title_ja": "論文タイトルの日本語訳", "summary_ja": "アブストラクトの日本語要約"}}"""
 
             response = await self.client.chat.completions.create(
                 model="gpt-3.5-turbo",
@@ -66,24 +174,27 @@ class PaperSummarizer:
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=0.3,
-                max_tokens=1000,  # トークン数を増やして十分な要約を得られるようにする
-                top_p=0.9
+                max_tokens=_max_tokens_for(paper),
+                response_format={"type": "json_object"}
             )
             
-            content = response.choices[0].message.content
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                # 出力が上限で打ち切られたJSONは解析できないため、キャッシュせずに次回の再要約に回す
+                logger.warning(f"Summary truncated at max_tokens for paper: {paper['title']}")
+                return {
+                    "title": paper["title"],
+                    "title_ja": paper["title"],
+                    "summary_ja": "要約が長すぎるため生成を完了できませんでした。"
+                }
+            
+            content = choice.message.content
             logger.info(f"Raw AI response: {content}")
             
             # タイトルと要約を抽出
-            title_ja = ""
-            summary_ja = ""
-            
-            # 応答が期待通りのフォーマットかチェック
-            lines = content.split("\n")
-            for line in lines:
-                if line.startswith("タイトル：") or line.startswith("タイトル:"):
-                    title_ja = line.split("：", 1)[1].strip() if "：" in line else line.split(":", 1)[1].strip()
-                elif line.startswith("要約：") or line.startswith("要約:"):
-                    summary_ja = line.split("：", 1)[1].strip() if "：" in line else line.split(":", 1)[1].strip()
+            data = orjson.loads(content)
+            title_ja = data.get("title_ja") or ""
+            summary_ja = data.get("summary_ja") or ""
             
             # 抽出に失敗した場合のフォールバック
             if not title_ja:
@@ -106,11 +217,13 @@ class PaperSummarizer:
             logger.info(f"summary_ja length: {len(summary_ja)}")
 
             if cache_key:
-                self.cache.set(cache_key, result)
+                self._set_cached(cache_key, result)
                 logger.info(f"Cached summary for paper: {paper['title']}")
 
             return result
 
+        except FATAL_ERRORS:
+            raise
         except Exception as e:
             logger.error(f"Error generating summary: {str(e)}")
             # エラー時にもデフォルト値を返す
@@ -119,3 +232,102 @@ class PaperSummarizer:
                 "title_ja": paper["title"],  # エラー時は英語タイトルをそのまま使用
                 "summary_ja": f"要約の生成中にエラーが発生しました: {str(e)}"
             }
+
+    async def summarize_batch(self, papers: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        複数の論文の日本語要約を1回のAPI呼び出しでまとめて生成
+
+        Args:
+            papers (List[Dict[str, Any]]): 論文データのリスト（title, summaryが必要）
+
+        Returns:
+            List[Dict[str, str]]: 入力と同じ順序の要約結果（形式はsummarizeと同じ）
+        """
+        results: List[Any] = [None] * len(papers)
+        pending = []
+        for i, paper in enumerate(papers):
+            cache_key = paper.get("entry_id")
+            cached_result = self._get_cached(cache_key) if cache_key else None
+            if cached_result is not None:
+                logger.info(f"Cache hit for paper: {paper['title']}")
+                results[i] = cached_result
+            else:
+                pending.append(i)
+
+        # 1件だけ、またはテストモードの場合は個別の要約処理を使用
+        if len(pending) <= 1 or self.test_mode:
+            for i in pending:
+                results[i] = await self.summarize(papers[i])
+            return results
+
+        try:
+            system_prompt = "あなたは学術論文の専門家です。英語の学術論文のタイトルと要約を日本語に翻訳してください。簡潔かつ正確に翻訳してください。"
+            paper_blocks = "\n\n".join(
+                f"ID：{n}\nタイトル：{papers[i]['title']}\nアブストラクト：{papers[i]['summary']}"
+                for n, i in enumerate(pending)
+            )
+            user_prompt = f"""{paper_blocks}
+
+各論文について、以下のJSON形式で必ず回答してください：
+{{"papers": [{{"id": ID, "title_ja": "論文タイトルの日本語訳", "summary_ja": "アブストラクトの日本語要約"}}]}}"""
+
+            response = await self.client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=0.3,
+                # 複数論文分の出力が入るよう、モデルの出力上限まで使えるようにする
+                max_tokens=MAX_OUTPUT_TOKENS,
+                response_format={"type": "json_object"}
+            )
+
+            choice = response.choices[0]
+            if choice.finish_reason == "length":
+                # 出力が上限で打ち切られた場合は、1件ずつではなく半分ずつまとめて要約し直す
+                logger.warning(f"Batch summary truncated at max_tokens, splitting {len(pending)} papers")
+                pending_papers = [papers[i] for i in pending]
+                half = len(pending_papers) // 2
+                retried = await self.summarize_batch(pending_papers[:half])
+                retried += await self.summarize_batch(pending_papers[half:])
+                for i, result in zip(pending, retried):
+                    results[i] = result
+                return results
+
+            items = orjson.loads(choice.message.content).get("papers", [])
+        except FATAL_ERRORS:
+            raise
+        except Exception as e:
+            logger.error(f"Error generating batch summary: {str(e)}")
+            items = []
+
+        # IDで結果を対応付ける
+        by_id = {}
+        for item in items:
+            try:
+                by_id[int(item["id"])] = item
+            except (KeyError, TypeError, ValueError):
+                continue
+
+        for n, i in enumerate(pending):
+            paper = papers[i]
+            item = by_id.get(n)
+            if not item or not item.get("summary_ja"):
+                # まとめて要約できなかった論文は個別に要約する
+                logger.warning(f"Batch summary missing for paper, falling back: {paper['title']}")
+                results[i] = await self.summarize(paper)
+                continue
+
+            result = {
+                "title": paper["title"],
+                "title_ja": item.get("title_ja") or paper["title"],
+                "summary_ja": item["summary_ja"]
+            }
+            cache_key = paper.get("entry_id")
+            if cache_key:
+                self._set_cached(cache_key, result)
+                logger.info(f"Cached summary for paper: {paper['title']}")
+            results[i] = result
+
+        return results
@@ -0,0 +1,40 @@
+import asyncio
+import time
+
+
+class DomainLimiter:
+    """
+    同一ドメインへのリクエスト開始間隔を制限する非同期コンテキストマネージャ。
+    
+    `async with limiter:` で囲んだ処理は、前回の開始から interval 秒以上空けて開始されます。
+    サーバーから429 (Too Many Requests) が返された場合は pause() で次回の開始を遅らせます。
+    """
+    
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval (float): リクエスト開始の最小間隔（秒）
+        """
+        self.interval = interval
+        self._lock = asyncio.Lock()
+        self._next_time = 0.0
+    
+    async def __aenter__(self):
+        async with self._lock:
+            wait = self._next_time - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._next_time = time.monotonic() + self.interval
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+    
+    def pause(self, seconds: float):
+        """
+        次回のリクエスト開始を指定秒数後まで遅らせる
+        
+        Args:
+            seconds (float): 待機する秒数
+        """
+        self._next_time = max(self._next_time, time.monotonic() + seconds)
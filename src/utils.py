@@ -1,37 +1,75 @@
 from loguru import logger
 from pathlib import Path
 import json
-from typing import Dict, Any, Optional, TypeVar, Generic, Type, Callable, Awaitable
+try:
+    import orjson
+except ImportError:  # orjsonが利用できない環境では標準のjsonを使用
+    orjson = None
+from typing import Dict, Any, Optional, TypeVar, Generic, Type, Callable, Awaitable, Tuple
 import os
 import functools
 import asyncio
-from datetime import datetime
-from diskcache import Cache
+import hashlib
+import pickle
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from diskcache import Cache, Disk, UNKNOWN
+from diskcache.core import MODE_PICKLE
+
+_DIRS_READY = False
+_DIRS_LOCK = threading.Lock()
+
+def _ensure_dirs():
+    """ログ・キャッシュ用のディレクトリを作成する（プロセス内で一度だけ実行）"""
+    global _DIRS_READY
+    with _DIRS_LOCK:
+        if _DIRS_READY:
+            return
+        Path("logs").mkdir(exist_ok=True)
+        Path("cache").mkdir(exist_ok=True)
+        _DIRS_READY = True
+
+_ensure_dirs()
+
+# アプリ全体で共有するログファイルの出力先（モジュール読み込み時に一度だけ登録する）
+# 単一プロセスのためキュー経由にせず、直接ファイルに書き込む
+# （行単位でフラッシュし、異常終了時にもログが失われないようにする）
+logger.add("logs/app.log", rotation="500 MB", enqueue=False)
 
 def setup_logger(name):
     """
     ロガーの設定を行う共通関数
     
+    出力先は共有のログファイル（logs/app.log）で、各レコードのextra["module"]に名前が設定されます。
+    
     Args:
-        name (str): ログファイル名のプレフィックス
+        name (str): ログを出力するモジュールの名前
     
     Returns:
-        logger: 設定済みのloggerインスタンス
+        logger: モジュール名を紐付けたloggerインスタンス
     """
-    # ログディレクトリの確保
-    Path("logs").mkdir(exist_ok=True)
-    
-    # ロガーの設定
-    log_file = f"logs/{name}.log"
-    logger.add(log_file, rotation="500 MB", enqueue=True)
-    
-    return logger
+    return logger.bind(module=name)
 
 T = TypeVar('T')
 
 class ConfigManager:
     """設定ファイルの読み込み・保存を行う共通クラス"""
     
+    # load_json_cached用のキャッシュ（パス -> ((更新日時, サイズ), 内容)）
+    _mtime_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+    
+    # 存在しなかったファイルの記録（パス -> 確認時刻）。一定時間はファイルを確認せず空辞書を返す
+    _miss_cache: Dict[str, float] = {}
+    _MISS_TTL = 5.0
+    
+    # 保存処理をファイルごとに直列化するロック（スレッド間・コルーチン間）
+    _save_locks: Dict[str, threading.Lock] = {}
+    _async_save_locks: Dict[str, asyncio.Lock] = {}
+    _save_locks_guard = threading.Lock()
+    
     @staticmethod
     def load_json(file_path: str) -> Dict[str, Any]:
         """JSONファイルを読み込む
@@ -42,24 +80,102 @@ class ConfigManager:
         Returns:
             Dict[str, Any]: JSONの内容、ファイルが存在しない場合は空辞書
         """
-        path = Path(file_path)
-        if path.exists():
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        return {}
+        checked_at = ConfigManager._miss_cache.get(file_path)
+        if checked_at is not None and time.monotonic() - checked_at < ConfigManager._MISS_TTL:
+            return {}
+        
+        try:
+            with open(file_path, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            ConfigManager._miss_cache[file_path] = time.monotonic()
+            return {}
+        ConfigManager._miss_cache.pop(file_path, None)
+        return orjson.loads(content) if orjson else json.loads(content)
+    
+    @classmethod
+    def load_json_cached(cls, file_path: str) -> Dict[str, Any]:
+        """JSONファイルを読み込む（ファイルが更新されていなければ前回の内容を返す）
+        
+        戻り値はキャッシュと共有されるため、呼び出し側で変更しないでください。
+        
+        Args:
+            file_path (str): JSONファイルのパス
+            
+        Returns:
+            Dict[str, Any]: JSONの内容、ファイルが存在しない場合は空辞書
+        """
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
+            cls._mtime_cache.pop(file_path, None)
+            return {}
+        
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = cls._mtime_cache.get(file_path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        
+        # statで存在を確認済みのため、存在しなかった記録は破棄して読み込む
+        cls._miss_cache.pop(file_path, None)
+        data = cls.load_json(file_path)
+        cls._mtime_cache[file_path] = (stamp, data)
+        return data
     
     @staticmethod
-    def save_json(file_path: str, data: Dict[str, Any]) -> None:
+    def save_json(file_path: str, data: Dict[str, Any], durable: bool = False) -> None:
         """JSONファイルに保存する
         
+        一時ファイルに書き込んでから置き換えるため、書き込み途中で中断されても
+        既存のファイルが壊れることはありません。
+        
         Args:
             file_path (str): 保存先のパス
             data (Dict[str, Any]): 保存するデータ
+            durable (bool): Trueの場合、置き換え前にfsyncして電源断などでも内容が失われないようにする
         """
         path = Path(file_path)
         path.parent.mkdir(parents=True, exist_ok=True)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        with ConfigManager._save_locks_guard:
+            lock = ConfigManager._save_locks.setdefault(file_path, threading.Lock())
+        
+        # 同じファイルへの保存は1つずつ実行する（一時ファイルはスレッドごとに別名で作成）
+        with lock:
+            if orjson:
+                content = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            else:
+                content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + '.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                    if durable:
+                        # 置き換え前に内容をディスクへ確実に書き出す
+                        f.flush()
+                        os.fsync(f.fileno())
+                os.replace(tmp_path, path)
+            except BaseException:
+                # 置き換えに失敗した一時ファイルは残さない
+                try:
+                    os.unlink(tmp_path)
+                except FileNotFoundError:
+                    pass
+                raise
+            ConfigManager._miss_cache.pop(file_path, None)
+    
+    @staticmethod
+    async def save_json_async(file_path: str, data: Dict[str, Any], durable: bool = False) -> None:
+        """JSONファイルに保存する（イベントループをブロックしないよう別スレッドで実行）
+        
+        Args:
+            file_path (str): 保存先のパス
+            data (Dict[str, Any]): 保存するデータ
+            durable (bool): Trueの場合、置き換え前にfsyncする
+        """
+        # 呼び出し順に保存して、後から呼ばれた保存の内容が最終的に残るようにする
+        lock = ConfigManager._async_save_locks.setdefault(file_path, asyncio.Lock())
+        async with lock:
+            await asyncio.to_thread(ConfigManager.save_json, file_path, data, durable)
             
     @staticmethod
     def ensure_dir(directory: str) -> None:
@@ -70,44 +186,207 @@ class ConfigManager:
         """
         Path(directory).mkdir(parents=True, exist_ok=True)
 
-def async_error_handler(log_prefix: str):
+def async_error_handler(log_prefix: str,
+                        *,
+                        ignore: Tuple[Type[BaseException], ...] = (),
+                        warn: Tuple[Type[BaseException], ...] = (asyncio.TimeoutError,)):
     """
     非同期関数のエラーハンドリングを行うデコレータ
     
     Args:
         log_prefix (str): ログメッセージのプレフィックス
+        ignore (Tuple[Type[BaseException], ...]): ログを出力せずにそのまま送出する例外
+        warn (Tuple[Type[BaseException], ...]): トレースバックなしの警告として記録する例外
     
     Returns:
         Callable: デコレータ関数
     """
+    # ロガーはデコレータ作成時に一度だけ取得する
+    module_logger = setup_logger("error_handler")
+    
     def decorator(func):
         @functools.wraps(func)
         async def wrapper(*args, **kwargs):
             try:
                 return await func(*args, **kwargs)
+            except ignore:
+                raise
+            except warn as e:
+                module_logger.warning(f"{log_prefix}: {str(e)}")
+                raise
             except Exception as e:
-                module_logger = setup_logger("error_handler")
-                module_logger.error(f"{log_prefix}: {str(e)}", exc_info=True)
+                # loguruはexc_infoを解釈しないため、opt(exception=...)でトレースバックを記録する
+                module_logger.opt(exception=e).error(f"{log_prefix}: {str(e)}")
                 raise
         return wrapper
     return decorator
 
+def async_retry(exceptions: Tuple[Type[BaseException], ...], retries: int = 3, base_delay: float = 1.0):
+    """
+    非同期関数を指数バックオフ付きでリトライするデコレータ
+    
+    Args:
+        exceptions (Tuple[Type[BaseException], ...]): リトライ対象の例外
+        retries (int): 最大リトライ回数
+        base_delay (float): 初回リトライまでの待機時間（秒）。リトライごとに2倍になる
+    
+    Returns:
+        Callable: デコレータ関数
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(retries + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except exceptions as e:
+                    if attempt >= retries:
+                        raise
+                    delay = base_delay * (2 ** attempt)
+                    logger.warning(f"{func.__name__} が失敗しました（{attempt + 1}回目）。{delay}秒後にリトライします: {str(e)}")
+                    await asyncio.sleep(delay)
+        return wrapper
+    return decorator
+
+# diskcacheのSQLite設定（再生成できるキャッシュのため、耐久性より書き込み速度を優先する）
+# WALモードとsynchronous=NORMALでコミットごとのfsyncを避ける
+CACHE_SETTINGS: Dict[str, Any] = {
+    "sqlite_journal_mode": "wal",
+    "sqlite_synchronous": 1,  # NORMAL
+}
+
+class OrjsonDisk(Disk):
+    """
+    値をpickleではなくJSON（orjson）でシリアライズするdiskcache用のDisk
+    
+    キーは標準のDiskと同じ形式で保存し、辞書・リスト・文字列などJSONで表現できる値のみを扱う
+    """
+    
+    def store(self, value, read, key=UNKNOWN):
+        if not read:
+            if orjson is not None:
+                value = orjson.dumps(value)
+            else:
+                value = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        return super().store(value, read, key=key)
+    
+    def fetch(self, mode, filename, value, read):
+        data = super().fetch(mode, filename, value, read)
+        if not read:
+            data = orjson.loads(data) if orjson is not None else json.loads(data)
+        return data
+
+class CompressedDisk(Disk):
+    """
+    値をpickleした上でzlib圧縮して保存するdiskcache用のDisk
+    
+    論文のアブストラクトなどテキストが大半を占める値は圧縮率が高く、ディスクI/Oを削減できる
+    圧縮導入前に保存された（圧縮されていない）pickle形式の値もそのまま読み込める
+    """
+    
+    def __init__(self, directory, compress_level=1, **kwargs):
+        self.compress_level = compress_level
+        super().__init__(directory, **kwargs)
+    
+    def store(self, value, read, key=UNKNOWN):
+        if not read:
+            value = zlib.compress(pickle.dumps(value, protocol=self.pickle_protocol), self.compress_level)
+        return super().store(value, read, key=key)
+    
+    def fetch(self, mode, filename, value, read):
+        data = super().fetch(mode, filename, value, read)
+        if not read and mode != MODE_PICKLE:
+            data = pickle.loads(zlib.decompress(data))
+        return data
+
+class _FetchAbandoned(Exception):
+    """キャッシュの取得を担当していた呼び出し元がキャンセルされたことを待機側に伝える例外"""
+
 class CacheManager:
     """キャッシュ操作のための共通クラス"""
     
     _cache_instance = None
+    _cache_lock = threading.Lock()
+    
+    # diskcacheの前段に置くプロセス内LRUキャッシュ（キー -> (有効期限, pickle済みの値)）
+    # 呼び出し元が結果を変更してもキャッシュに影響しないよう、取り出すたびに復元する
+    _mem: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+    _MEM_MAX = 1024
+    _mem_lock = threading.Lock()
+    
+    # 取得中のキー（同じキーの同時取得は1回の処理にまとめ、結果はpickle済みの値で共有する）
+    _inflight: Dict[str, asyncio.Future] = {}
+    
+    @classmethod
+    def _mem_get(cls, key: str) -> Any:
+        """
+        メモリ上のキャッシュからデータを取得
+        
+        Args:
+            key (str): キャッシュのキー
+            
+        Returns:
+            Any: キャッシュデータ（ない場合や期限切れの場合はNone）
+        """
+        with cls._mem_lock:
+            entry = cls._mem.get(key)
+            if entry is None:
+                return None
+            expire_time, data = entry
+            if expire_time is not None and expire_time <= time.time():
+                del cls._mem[key]
+                return None
+            cls._mem.move_to_end(key)
+        return pickle.loads(data)
+    
+    @classmethod
+    def _mem_set(cls, key: str, value: Any, expire_time: Optional[float]) -> bytes:
+        """
+        メモリ上のキャッシュにデータを追加し、上限を超えた古いエントリを削除
+        
+        Args:
+            key (str): キャッシュのキー
+            value (Any): キャッシュするデータ
+            expire_time (Optional[float]): 有効期限（UNIX時間）。Noneの場合は無期限
+            
+        Returns:
+            bytes: pickle済みの値
+        """
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with cls._mem_lock:
+            cls._mem[key] = (expire_time, data)
+            cls._mem.move_to_end(key)
+            if len(cls._mem) > cls._MEM_MAX:
+                cls._mem.popitem(last=False)
+        return data
+    
+    @staticmethod
+    def _k(key: str) -> int:
+        """
+        diskcacheに保存する際のキーを64ビット整数のハッシュ値に変換
+        
+        長い文字列キーの比較を避け、SQLiteには整数キーとして保存する
+        
+        Args:
+            key (str): キャッシュのキー
+            
+        Returns:
+            int: 符号付き64ビット整数のハッシュ値
+        """
+        return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
     
     @classmethod
     def get_cache(cls) -> Cache:
         """キャッシュインスタンスを取得（シングルトン）"""
+        # 初期化後はロックを取らずに返し、初回のみロック内で再確認して生成する
         if cls._cache_instance is None:
-            # キャッシュディレクトリの確保
-            Path("cache").mkdir(exist_ok=True)
-            cls._cache_instance = Cache("cache")
+            with cls._cache_lock:
+                if cls._cache_instance is None:
+                    cls._cache_instance = Cache("cache", disk=CompressedDisk, **CACHE_SETTINGS)
         return cls._cache_instance
     
     @classmethod
-    def get_or_set(cls, key: str, value_func: Callable[[], Any], expire: int = None) -> Any:
+    def get_or_set(cls, key: str, value_func: Callable[[], Any], expire: int = None, skip_cache: bool = False) -> Any:
         """
         キャッシュからデータを取得、なければ関数を実行して結果をキャッシュ
         
@@ -115,19 +394,30 @@ class CacheManager:
             key (str): キャッシュのキー
             value_func (Callable): キャッシュがない場合に実行する関数
             expire (int, optional): 有効期限（秒）
+            skip_cache (bool): Trueの場合はキャッシュを読み書きせず関数の結果をそのまま返す
+                （キャッシュが再利用されないことが分かっている呼び出しで使用）
             
         Returns:
             Any: キャッシュデータまたは関数の実行結果
         """
+        if skip_cache:
+            return value_func()
+        
+        value = cls._mem_get(key)
+        if value is not None:
+            return value
+        
         cache = cls.get_cache()
-        value = cache.get(key)
+        value, expire_time = cache.get(cls._k(key), expire_time=True)
         if value is None:
             value = value_func()
-            cache.set(key, value, expire=expire)
+            cache.set(cls._k(key), value, expire=expire)
+            expire_time = time.time() + expire if expire else None
+        cls._mem_set(key, value, expire_time)
         return value
     
     @classmethod
-    async def get_or_set_async(cls, key: str, value_func: Callable[[], Awaitable[Any]], expire: int = None) -> Any:
+    async def get_or_set_async(cls, key: str, value_func: Callable[[], Awaitable[Any]], expire: int = None, skip_cache: bool = False) -> Any:
         """
         非同期関数用のキャッシュ取得・設定
         
@@ -135,13 +425,52 @@ class CacheManager:
             key (str): キャッシュのキー
             value_func (Callable): キャッシュがない場合に実行する非同期関数
             expire (int, optional): 有効期限（秒）
+            skip_cache (bool): Trueの場合はキャッシュを読み書きせず関数の結果をそのまま返す
+                （キャッシュが再利用されないことが分かっている呼び出しで使用）
             
         Returns:
             Any: キャッシュデータまたは関数の実行結果
         """
-        cache = cls.get_cache()
-        value = cache.get(key)
-        if value is None:
-            value = await value_func()
-            cache.set(key, value, expire=expire)
-        return value
\ No newline at end of file
+        if skip_cache:
+            return await value_func()
+        
+        value = cls._mem_get(key)
+        if value is not None:
+            return value
+        
+        # 同じキーの取得が実行中であればその結果を待つ（待機側のキャンセルは共有中の処理に影響させない）
+        fut = cls._inflight.get(key)
+        if fut is not None:
+            try:
+                return pickle.loads(await asyncio.shield(fut))
+            except _FetchAbandoned:
+                # 取得していた呼び出し元がキャンセルされたため、待機側が取得を引き継ぐ
+                # （最初に再開した呼び出しが取得し、残りはその結果を待つ）
+                return await cls.get_or_set_async(key, value_func, expire)
+        
+        fut = asyncio.get_running_loop().create_future()
+        cls._inflight[key] = fut
+        try:
+            cache = cls.get_cache()
+            # SQLiteへの読み書きでイベントループをブロックしないようスレッドで実行
+            disk_key = cls._k(key)
+            value, expire_time = await asyncio.to_thread(cache.get, disk_key, expire_time=True)
+            if value is None:
+                value = await value_func()
+                await asyncio.to_thread(cache.set, disk_key, value, expire=expire)
+                expire_time = time.time() + expire if expire else None
+            fut.set_result(cls._mem_set(key, value, expire_time))
+            return value
+        except Exception as e:
+            fut.set_exception(e)
+            # 待機中の呼び出し元がいない場合に未取得の例外として警告されないようにする
+            fut.exception()
+            raise
+        except asyncio.CancelledError:
+            # 共有中のFutureはキャンセルせず、待機側に取得の引き継ぎを依頼する
+            fut.set_exception(_FetchAbandoned(key))
+            fut.exception()
+            raise
+        finally:
+            if cls._inflight.get(key) is fut:
+                del cls._inflight[key]